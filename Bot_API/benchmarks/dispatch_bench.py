@@ -0,0 +1,124 @@
+"""
+Бенчмарк маршрутизации: стоимость обработки обычного текстового сообщения
+пользователя без FSM-состояния админ-роутером.
+
+Сравнивает прежний catch-all хендлер (lambda m: m.text + state.get_state())
+с индексом по FSM-состоянию (DispatchIndex). Перед замером оба варианта
+прогреваются, затем прогоны чередуются, выводятся минимум и медиана.
+Запуск из каталога Bot_API:
+
+    python -m benchmarks.dispatch_bench [количество обновлений] [количество прогонов]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+
+from handlers.admin import admin_router
+
+
+class CountingStorage(MemoryStorage):
+    """MemoryStorage, считающий чтения состояния"""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_state(self, key):
+        self.reads += 1
+        return await super().get_state(key)
+
+
+def build_legacy_router() -> Router:
+    """Роутер с прежним catch-all хендлером ввода ID админа"""
+    router = Router(name="legacy_admin_router")
+
+    @router.message(lambda m: m.text)
+    async def process_admin_id(message: Message, state: FSMContext):
+        current_state = await state.get_state()
+        if current_state != "waiting_admin_id":
+            return
+
+    return router
+
+
+def make_update(update_id: int) -> Update:
+    """Текстовое сообщение обычного пользователя"""
+    user_id = 100000 + update_id % 5000
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="User"),
+            text="привет"
+        )
+    )
+
+
+def build_dispatcher(router: Router) -> Dispatcher:
+    """Диспетчер со считающим хранилищем (роутер подключается один раз)"""
+    dp = Dispatcher(storage=CountingStorage())
+    dp.include_router(router)
+    return dp
+
+
+async def run(dp: Dispatcher, bot: Bot, updates) -> dict:
+    """Прогоняет обновления через диспетчер и возвращает метрики"""
+    storage = dp.storage
+    storage.reads = 0
+
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "us_per_update": elapsed / len(updates) * 1_000_000,
+        "storage_reads_per_update": storage.reads / len(updates)
+    }
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    updates = [make_update(i) for i in range(count)]
+    bot = Bot(token="42:BENCHMARK")
+    variants = {
+        "catch-all": build_dispatcher(build_legacy_router()),
+        "indexed": build_dispatcher(admin_router)
+    }
+    results = {name: [] for name in variants}
+
+    try:
+        # Прогрев: кэши фильтров, модели pydantic и аллокатор интерпретатора
+        for dp in variants.values():
+            await run(dp, bot, updates[:count // 10 or 1])
+
+        # Чередуем порядок, чтобы ни один вариант не был всегда первым
+        for round_number in range(rounds):
+            order = list(variants.items())
+            if round_number % 2:
+                order.reverse()
+            for name, dp in order:
+                results[name].append(await run(dp, bot, updates))
+
+        for name, runs in results.items():
+            timings = [result["us_per_update"] for result in runs]
+            print(
+                f"{name:>10}: мин. {min(timings):.1f}, медиана {statistics.median(timings):.1f}, "
+                f"макс. {max(timings):.1f} мкс/обновление, "
+                f"чтений хранилища: {runs[-1]['storage_reads_per_update']:.1f}"
+            )
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
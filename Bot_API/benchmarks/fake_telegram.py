@@ -0,0 +1,325 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Поддерживает getMe, getUpdates (long polling), setWebhook/deleteWebhook
+(доставка обновлений POST-запросами на webhook бота), sendMessage, sendVideo,
+editMessageText, deleteMessage, answerCallbackQuery. Задержка ответа и доля
+ответов 429 настраиваются. Сервер фиксирует время от отправки обновления
+до первого ответа бота этому пользователю.
+
+Используется из benchmarks.load_test, но может быть запущен отдельно:
+
+    python -m benchmarks.fake_telegram --port 8081 --latency 0.05 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from aiohttp import ClientSession, web
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Методы, на которые бот отвечает пользователю (для 429 и замера задержки)
+REPLY_METHODS = {"sendMessage", "sendVideo", "editMessageText", "deleteMessage", "answerCallbackQuery"}
+
+# Размер выборки задержек (reservoir sampling): память не растет на длинных прогонах
+LATENCY_SAMPLES = 100_000
+
+# Поля form-data, которые aiogram передает в виде JSON
+JSON_FIELDS = {"reply_markup", "entities", "caption_entities", "allowed_updates", "link_preview_options"}
+
+
+class TokenState:
+    """Очередь обновлений и режим доставки одного бота"""
+
+    def __init__(self):
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.webhook_url: Optional[str] = None
+        self.secret_token: Optional[str] = None
+        self.delivery_task: Optional[asyncio.Task] = None
+
+
+class FakeTelegramServer:
+    """Фейковый Bot API на aiohttp"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+        self.tokens: Dict[str, TokenState] = defaultdict(TokenState)
+        self.ready = asyncio.Event()
+
+        # Замер задержки: пользователь -> время отправки обновления.
+        # Все словари содержат не больше одной записи на пользователя
+        self._pending: Dict[int, float] = {}
+        self._callbacks: Dict[str, int] = {}
+        self._user_callbacks: Dict[int, str] = {}
+        self._waiters: Dict[int, asyncio.Future] = {}
+
+        self.reset_stats()
+
+        self._update_id = 0
+        self._message_id = 0
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def reset_stats(self):
+        """Обнуляет счетчики вызовов и задержек (ожидающие ответы не трогает)"""
+        self.method_counts: Dict[str, int] = defaultdict(int)
+        self.injected_429 = 0
+
+        # Равномерная выборка задержек, точные количество и максимум
+        self.latencies: List[float] = []
+        self.latency_count = 0
+        self.latency_max = 0.0
+
+    # --- Отправка обновлений ---
+
+    def push_update(self, token: str, update: dict) -> asyncio.Future:
+        """Ставит обновление в очередь бота и возвращает future с задержкой ответа"""
+        self._update_id += 1
+        update["update_id"] = self._update_id
+
+        user_id = self._user_of(update)
+        self._drop_callback(user_id)
+        callback = update.get("callback_query")
+        if callback:
+            self._callbacks[callback["id"]] = user_id
+            self._user_callbacks[user_id] = callback["id"]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[user_id] = time.perf_counter()
+        self._waiters[user_id] = future
+        self.tokens[token].updates.put_nowait(update)
+        return future
+
+    def next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    @staticmethod
+    def _user_of(update: dict) -> int:
+        event = update.get("message") or update.get("callback_query")
+        return event["from"]["id"]
+
+    def _drop_callback(self, user_id: int):
+        """Удаляет callback пользователя: многие хендлеры не вызывают answerCallbackQuery"""
+        callback_id = self._user_callbacks.pop(user_id, None)
+        if callback_id is not None:
+            self._callbacks.pop(callback_id, None)
+
+    def _record_latency(self, latency: float):
+        """Добавляет задержку в ограниченную выборку (алгоритм R)"""
+        self.latency_count += 1
+        self.latency_max = max(self.latency_max, latency)
+        if len(self.latencies) < LATENCY_SAMPLES:
+            self.latencies.append(latency)
+            return
+        index = random.randrange(self.latency_count)
+        if index < LATENCY_SAMPLES:
+            self.latencies[index] = latency
+
+    def _resolve(self, user_id: Optional[int]):
+        """Отмечает первый ответ бота пользователю"""
+        started = self._pending.pop(user_id, None)
+        if started is None:
+            return
+        self._drop_callback(user_id)
+        latency = time.perf_counter() - started
+        self._record_latency(latency)
+        waiter = self._waiters.pop(user_id, None)
+        if waiter and not waiter.done():
+            waiter.set_result(latency)
+
+    def forget(self, user_id: int):
+        """Снимает ожидание ответа (таймаут на стороне драйвера)"""
+        self._pending.pop(user_id, None)
+        self._waiters.pop(user_id, None)
+        self._drop_callback(user_id)
+
+    # --- HTTP ---
+
+    async def _params(self, request: web.Request) -> dict:
+        """Параметры запроса: aiogram отправляет multipart/form-data, допускаем и JSON"""
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if key in JSON_FIELDS and isinstance(value, str):
+                value = json.loads(value)
+            params[key] = value
+        return params
+
+    def _message(self, chat_id, text: Optional[str] = None, message_id: Optional[int] = None) -> dict:
+        """Минимальный объект Message, который примет aiogram"""
+        chat_id = int(chat_id)
+        message = {
+            "message_id": message_id or self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "FakeBot"}
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.match_info["token"]
+        method = request.match_info["method"]
+        self.method_counts[method] += 1
+        params = await self._params(request)
+
+        if method in REPLY_METHODS:
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+            if self.rate_429 and random.random() < self.rate_429:
+                self.injected_429 += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                }, status=429)
+
+        handler = getattr(self, f"_method_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": await handler(token, params)})
+
+    async def _method_getMe(self, token, params):
+        bot_id = int(token.split(":")[0])
+        return {"id": bot_id, "is_bot": True, "first_name": "FakeBot", "username": f"fake_{bot_id}_bot"}
+
+    async def _method_getUpdates(self, token, params):
+        self.ready.set()
+        queue = self.tokens[token].updates
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(queue.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while not queue.empty() and len(updates) < 100:
+            updates.append(queue.get_nowait())
+        return updates
+
+    async def _method_setWebhook(self, token, params):
+        state = self.tokens[token]
+        state.webhook_url = params.get("url")
+        state.secret_token = params.get("secret_token")
+        if state.delivery_task is None:
+            state.delivery_task = asyncio.create_task(self._deliver(state))
+        self.ready.set()
+        return True
+
+    async def _method_deleteWebhook(self, token, params):
+        state = self.tokens[token]
+        state.webhook_url = None
+        if state.delivery_task is not None:
+            state.delivery_task.cancel()
+            state.delivery_task = None
+        return True
+
+    async def _method_sendMessage(self, token, params):
+        self._resolve(int(params["chat_id"]))
+        return self._message(params["chat_id"], params.get("text", ""))
+
+    async def _method_sendVideo(self, token, params):
+        self._resolve(int(params["chat_id"]))
+        message = self._message(params["chat_id"])
+        message["caption"] = params.get("caption", "")
+        message["video"] = {
+            "file_id": str(params.get("video")),
+            "file_unique_id": "fake",
+            "width": 1, "height": 1, "duration": 1
+        }
+        return message
+
+    async def _method_editMessageText(self, token, params):
+        self._resolve(int(params["chat_id"]))
+        return self._message(params["chat_id"], params.get("text", ""), int(params["message_id"]))
+
+    async def _method_deleteMessage(self, token, params):
+        self._resolve(int(params["chat_id"]))
+        return True
+
+    async def _method_answerCallbackQuery(self, token, params):
+        self._resolve(self._callbacks.pop(params.get("callback_query_id"), None))
+        return True
+
+    async def _deliver(self, state: TokenState):
+        """Доставка обновлений на webhook бота (до 64 запросов одновременно, как у Telegram max_connections)"""
+        semaphore = asyncio.Semaphore(64)
+        tasks = set()
+        while True:
+            update = await state.updates.get()
+            await semaphore.acquire()
+            task = asyncio.create_task(self._post_update(state, update))
+            tasks.add(task)
+            task.add_done_callback(lambda done: (tasks.discard(done), semaphore.release()))
+
+    async def _post_update(self, state: TokenState, update: dict):
+        """Отправляет одно обновление на webhook"""
+        headers = {}
+        if state.secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = state.secret_token
+        # Бот ставит webhook до того, как начинает слушать порт, поэтому доставка повторяется
+        for attempt in range(50):
+            try:
+                async with self._session.post(state.webhook_url, json=update, headers=headers) as response:
+                    if response.status >= 400:
+                        logger.warning(f"Webhook ответил {response.status}")
+                return
+            except Exception as e:
+                if attempt == 49:
+                    logger.warning(f"Ошибка доставки на webhook: {e}")
+                await asyncio.sleep(0.1)
+
+    # --- Запуск ---
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._session = ClientSession()
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Фейковый Bot API запущен на http://{host}:{port}")
+
+    async def stop(self):
+        for state in self.tokens.values():
+            if state.delivery_task is not None:
+                state.delivery_task.cancel()
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    args = parser.parse_args()
+
+    server = FakeTelegramServer(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429)
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
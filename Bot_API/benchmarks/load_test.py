@@ -0,0 +1,389 @@
+"""
+Нагрузочный и soak-тест бота против локального фейкового Bot API.
+
+Запускает benchmarks.fake_telegram, стартует bot.py отдельным процессом
+с BOT_API_BASE_URL, указывающим на фейковый сервер, и прогоняет популяцию
+пользователей через /start, реферальные ссылки, обычные сообщения и
+админские сценарии. В отчете: пропускная способность, задержки ответа
+(p50/p95/p99), таймауты, операции MongoDB на обновление и рост RSS бота.
+
+Нужна запущенная MongoDB (MONGO_URI). Данные пишутся в отдельную базу
+(--db-name, по умолчанию loadtest). Запуск из каталога Bot_API:
+
+    python -m benchmarks.load_test --users 5000 --rate 200 --duration 60
+    python -m benchmarks.load_test --mode webhook --rate-429 0.01 --latency 0.05
+    python -m benchmarks.load_test --duration 3600 --sample-interval 60 --report soak.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.fake_telegram import FakeTelegramServer
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Базовые ID пользователей и админов нагрузки
+USER_ID_BASE = 10_000_000
+ADMIN_ID_BASE = 9_000_000
+
+# Сценарии нагрузки (методы LoadDriver.scenario_<name>) и их веса по умолчанию
+SCENARIOS = ("start", "start_ref", "text", "admin")
+DEFAULT_MIX = "start=60,start_ref=20,text=15,admin=5"
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Разбирает веса сценариев вида start=60,text=15"""
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        weights[name.strip()] = int(weight)
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по отсортированному списку"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """RSS процесса в МБ из /proc (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def mongo_ops(client: AsyncIOMotorClient) -> Optional[int]:
+    """Суммарный счетчик операций сервера MongoDB"""
+    try:
+        status = await client.admin.command("serverStatus")
+    except Exception:
+        return None
+    counters = status.get("opcounters", {})
+    return sum(counters.get(name, 0) for name in ("insert", "query", "update", "delete", "getmore"))
+
+
+class LoadDriver:
+    """Генерирует обновления от имени пользователей и собирает метрики"""
+
+    def __init__(self, server: FakeTelegramServer, token: str, args):
+        self.server = server
+        self.token = token
+        self.args = args
+        self.users = [USER_ID_BASE + i for i in range(args.users)]
+        self.admins = [ADMIN_ID_BASE + i for i in range(args.admins)]
+        self.busy = set()
+        self._ids = itertools.count(1)
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Обнуляет счетчики драйвера (после подготовки, перед нагрузкой)"""
+        self.stats = {
+            "sessions": 0,
+            "updates": 0,
+            "answered": 0,
+            "timeouts": 0,
+            "skipped_busy": 0
+        }
+
+    # --- Конструирование обновлений ---
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def message_update(self, user_id: int, text: str) -> dict:
+        return {"message": {
+            "message_id": self.server.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text
+        }}
+
+    def callback_update(self, user_id: int, data: str, message_id: int) -> dict:
+        return {"callback_query": {
+            "id": str(next(self._ids)),
+            "from": self._user(user_id),
+            "chat_instance": "load",
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "FakeBot"},
+                "text": "..."
+            }
+        }}
+
+    # --- Отправка ---
+
+    async def send(self, user_id: int, update: dict, wait: bool = True) -> Optional[float]:
+        """Отправляет обновление и ждет первого ответа бота пользователю"""
+        self.stats["updates"] += 1
+        future = self.server.push_update(self.token, update)
+        if not wait:
+            self.server.forget(user_id)
+            return None
+        try:
+            latency = await asyncio.wait_for(future, timeout=self.args.timeout)
+        except asyncio.TimeoutError:
+            self.server.forget(user_id)
+            self.stats["timeouts"] += 1
+            return None
+        self.stats["answered"] += 1
+        return latency
+
+    # --- Сценарии ---
+
+    async def scenario_start(self, user_id: int):
+        await self.send(user_id, self.message_update(user_id, "/start"))
+
+    async def scenario_start_ref(self, user_id: int):
+        referrer_id = random.choice(self.users)
+        await self.send(user_id, self.message_update(user_id, f"/start ref{referrer_id}"))
+
+    async def scenario_text(self, user_id: int):
+        # Обычное сообщение без состояния: бот не отвечает, проверяется путь маршрутизации
+        await self.send(user_id, self.message_update(user_id, "привет"), wait=False)
+
+    async def scenario_admin(self, admin_id: int):
+        # Навигация по админ-панели: каждый шаг меняет содержимое сообщения
+        message_id = self.server.next_message_id()
+        for data in ("admin_panel", "remove_admin", "admin_panel", "back_to_menu"):
+            if await self.send(admin_id, self.callback_update(admin_id, data, message_id)) is None:
+                return
+
+    async def add_admin(self, super_admin_id: int, new_admin_id: int) -> bool:
+        """Добавляет админа через админ-панель (сценарий добавления)"""
+        message_id = self.server.next_message_id()
+        for update in (
+            self.callback_update(super_admin_id, "admin_panel", message_id),
+            self.callback_update(super_admin_id, "add_admin", message_id),
+            self.message_update(super_admin_id, str(new_admin_id))
+        ):
+            if await self.send(super_admin_id, update) is None:
+                return False
+        return True
+
+    # --- Нагрузка ---
+
+    async def run_session(self, scenario: str, user_id: int):
+        try:
+            await getattr(self, f"scenario_{scenario}")(user_id)
+        finally:
+            self.busy.discard(user_id)
+
+    def pick_user(self, scenario: str) -> Optional[int]:
+        """Выбирает свободного пользователя (одно обновление в полете на пользователя)"""
+        population = self.admins if scenario == "admin" else self.users
+        for _ in range(10):
+            user_id = random.choice(population)
+            if user_id not in self.busy:
+                return user_id
+        return None
+
+    async def run(self, duration: float, mix: Dict[str, int]):
+        """Запускает сессии с заданной частотой в течение duration секунд"""
+        scenarios = [name for name in mix if mix[name] > 0 and (name != "admin" or self.admins)]
+        weights = [mix[name] for name in scenarios]
+        tasks = set()
+        interval = 1 / self.args.rate
+        started = time.perf_counter()
+        next_at = started
+
+        while time.perf_counter() - started < duration:
+            scenario = random.choices(scenarios, weights)[0]
+            user_id = self.pick_user(scenario)
+            if user_id is None:
+                self.stats["skipped_busy"] += 1
+            else:
+                self.busy.add(user_id)
+                self.stats["sessions"] += 1
+                task = asyncio.create_task(self.run_session(scenario, user_id))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.args.timeout * 5)
+
+
+async def sample_rss(pid: int, driver: LoadDriver, interval: float, samples: list):
+    """Периодически снимает RSS процесса бота"""
+    started = time.perf_counter()
+    while True:
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append({
+                "elapsed": round(time.perf_counter() - started, 1),
+                "rss_mb": round(rss, 1),
+                "updates": driver.stats["updates"]
+            })
+        await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный/soak-тест бота")
+    parser.add_argument("--users", type=int, default=2000, help="размер популяции пользователей")
+    parser.add_argument("--admins", type=int, default=5, help="число админов для админских сценариев")
+    parser.add_argument("--rate", type=float, default=100, help="новых сессий в секунду")
+    parser.add_argument("--duration", type=float, default=60, help="длительность нагрузки, с")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса сценариев")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фейкового API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--timeout", type=float, default=10.0, help="таймаут ответа бота, с")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8000)
+    parser.add_argument("--token", default="123456:LOADTEST")
+    parser.add_argument("--super-admin", type=int, default=8_999_999)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="loadtest")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="период замера RSS, с")
+    parser.add_argument("--bot-log", help="файл для вывода bot.py")
+    parser.add_argument("--report", help="сохранить отчет в JSON")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    server = FakeTelegramServer(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429)
+    await server.start(port=args.api_port)
+
+    mongo = AsyncIOMotorClient(args.mongo_uri, serverSelectionTimeoutMS=2000)
+    ops_before = None
+
+    env = dict(
+        os.environ,
+        BOT_TOKEN=args.token,
+        BOT_API_BASE_URL=f"http://127.0.0.1:{args.api_port}",
+        MONGO_URI=args.mongo_uri,
+        DB_NAME=args.db_name,
+        SUPER_ADMIN_ID=str(args.super_admin),
+        MINIAPP_URL=os.getenv("MINIAPP_URL", "https://example.com")
+    )
+    if args.mode == "webhook":
+        env.update(
+            BOT_WEBHOOK_BASE_URL=f"http://127.0.0.1:{args.webhook_port}",
+            BOT_WEBAPP_HOST="127.0.0.1",
+            BOT_WEBAPP_PORT=str(args.webhook_port)
+        )
+    else:
+        env.pop("BOT_WEBHOOK_BASE_URL", None)
+
+    bot_log = open(args.bot_log, "w") if args.bot_log else asyncio.subprocess.DEVNULL
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "bot.py",
+        cwd=BOT_DIR, env=env, stdout=bot_log, stderr=asyncio.subprocess.STDOUT
+    )
+
+    driver = LoadDriver(server, args.token, args)
+    samples = []
+    sampler = None
+    try:
+        await asyncio.wait_for(server.ready.wait(), timeout=30)
+
+        # Подготовка: супер-админ добавляет админов нагрузки через админ-панель
+        for admin_id in driver.admins:
+            if not await driver.add_admin(args.super_admin, admin_id):
+                print(f"⚠️ Не удалось добавить админа {admin_id}")
+
+        # Метрики считаются только по фазе нагрузки: запуск бота и подготовка не учитываются
+        driver.reset_stats()
+        server.reset_stats()
+        ops_before = await mongo_ops(mongo)
+        if ops_before is None:
+            print("⚠️ MongoDB недоступна: операции на обновление не будут посчитаны")
+
+        sampler = asyncio.create_task(sample_rss(process.pid, driver, args.sample_interval, samples))
+        started = time.perf_counter()
+        await driver.run(args.duration, mix)
+        elapsed = time.perf_counter() - started
+    finally:
+        if sampler is not None:
+            sampler.cancel()
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                process.kill()
+        await server.stop()
+
+    # Счетчики снимаются после остановки бота, чтобы учесть финальный сброс буферов
+    ops_after = await mongo_ops(mongo)
+    mongo.close()
+
+    latencies = sorted(server.latencies)
+    updates = driver.stats["updates"]
+    report = {
+        "mode": args.mode,
+        "duration_s": round(elapsed, 1),
+        **driver.stats,
+        "updates_per_s": round(updates / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(server.latency_max * 1000, 1),
+            "samples": len(latencies),
+            "count": server.latency_count
+        },
+        "api_calls": dict(server.method_counts),
+        "injected_429": server.injected_429,
+        "mongo_ops_per_update": (
+            round((ops_after - ops_before) / updates, 2)
+            if ops_before is not None and ops_after is not None and updates else None
+        ),
+        "rss_samples": samples
+    }
+    if len(samples) >= 2:
+        first, last = samples[0], samples[-1]
+        growth = last["rss_mb"] - first["rss_mb"]
+        per_10k = growth / max(last["updates"] - first["updates"], 1) * 10_000
+        report["rss_mb"] = {
+            "start": first["rss_mb"],
+            "end": last["rss_mb"],
+            "max": max(sample["rss_mb"] for sample in samples),
+            "growth": round(growth, 1),
+            "growth_per_10k_updates": round(per_10k, 2)
+        }
+
+    print(f"Режим: {report['mode']}, длительность: {report['duration_s']} с")
+    print(f"Обновлений: {updates} ({report['updates_per_s']}/с), сессий: {driver.stats['sessions']}")
+    print(f"Ответов: {driver.stats['answered']}, таймаутов: {driver.stats['timeouts']}, 429: {server.injected_429}")
+    print(f"Задержка, мс: {report['latency_ms']}")
+    print(f"Операций MongoDB на обновление: {report['mongo_ops_per_update']}")
+    if "rss_mb" in report:
+        print(f"RSS бота, МБ: {report['rss_mb']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
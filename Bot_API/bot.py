@@ -1,17 +1,31 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
-from motor.motor_asyncio import AsyncIOMotorClient
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
 from configs.config import (
     API_TOKEN,
     MONGO_URI,
     DB_NAME,
     SUPERUSER_COLLECTION,
-    SUPER_ADMIN_ID
+    SUPER_ADMIN_ID,
+    BOT_WEBHOOK_BASE_URL,
+    BOT_WEBHOOK_PATH,
+    BOT_WEBAPP_HOST,
+    BOT_WEBAPP_PORT,
+    BOTS_REFRESH_INTERVAL,
+    BOT_API_BASE_URL
 )
+from configs.mongo import db
 from handlers.start import start_router
-from handlers.admin import admin_router, load_welcome_video_id
+from handlers.admin import admin_router
+from middlewares.activity import ActivityTracker
+from utils.multibot import BotRegistry, RegistryRequestHandler
+from utils.referrals import referral_recorder
+from utils.tenants import load_welcome_video_id
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,9 +34,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Общий пул HTTP-соединений к Bot API для всех ботов процесса
+if BOT_API_BASE_URL:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_BASE_URL))
+else:
+    session = AiohttpSession()
+
 # Инициализация бота и диспетчера
 try:
-    bot = Bot(token=API_TOKEN)
+    bot = Bot(token=API_TOKEN, session=session)
 except Exception as e:
     logger.error(f"❌ Ошибка при инициализации бота: {e}")
     logger.error(f"Значение API_TOKEN: {repr(API_TOKEN)}")
@@ -30,12 +50,20 @@ except Exception as e:
     logger.error(f"Длина API_TOKEN: {len(API_TOKEN) if API_TOKEN else 0}")
     raise
 
+# FSM-ключи содержат bot_id, поэтому одно хранилище безопасно делится между ботами
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
+# Трекер активности пользователей (пакетная запись в профили)
+activity_tracker = ActivityTracker()
+dp.update.outer_middleware(activity_tracker)
+
 # Подключаем все роутеры к диспетчеру
 dp.include_routers(start_router, admin_router)
 
+# Реестр ботов для мультибот-режима (webhook)
+registry = BotRegistry(dp, bot, session)
+
 async def init_super_admin():
     """Инициализация супер-админа при запуске бота"""
     if not SUPER_ADMIN_ID:
@@ -44,8 +72,6 @@ async def init_super_admin():
     
     logger.info(f"🔧 Инициализация супер-админа: ID={SUPER_ADMIN_ID}, MONGO_URI={MONGO_URI}, DB={DB_NAME}, Collection={SUPERUSER_COLLECTION}")
     
-    client = AsyncIOMotorClient(MONGO_URI)
-    db = client[DB_NAME]
     superuser_collection = db[SUPERUSER_COLLECTION]
     
     try:
@@ -60,8 +86,6 @@ async def init_super_admin():
             logger.info(f"ℹ️ Супер-админ {SUPER_ADMIN_ID} уже существует в базе данных")
     except Exception as e:
         logger.error(f"❌ Ошибка при инициализации супер-админа: {e}")
-    finally:
-        client.close()
 
 async def on_startup(bot: Bot) -> None:
     """Функция, выполняемая при запуске бота"""
@@ -71,22 +95,58 @@ async def on_startup(bot: Bot) -> None:
     await init_super_admin()
     
     # Загрузка вступительного видео из БД в кэш
-    await load_welcome_video_id()
+    await load_welcome_video_id(bot)
     logger.info("Вступительное видео загружено в кэш")
     
+    # Запуск периодического сброса активности
+    activity_tracker.start()
+    
+    # Запуск пакетной записи реферальных связей
+    await referral_recorder.start()
+    
+    # В мультибот-режиме подключаем клиентских ботов из БД
+    if BOT_WEBHOOK_BASE_URL:
+        await registry.start(BOTS_REFRESH_INTERVAL)
+        logger.info(f"Мультибот-режим: подключено ботов {len(registry.bots)}")
+    
     # Сохраняем бота в диспетчере
     dp.bot = bot
 
 async def on_shutdown(bot: Bot) -> None:
     """Функция, выполняемая при остановке бота"""
+    await registry.stop()
+    # Записываем накопленную активность и рефералов перед выходом
+    await activity_tracker.stop()
+    await referral_recorder.stop()
     logger.info("Бот mirorai остановлен")
 
+async def run_webhook():
+    """Запуск всех ботов через один webhook-сервер"""
+    app = web.Application()
+    RegistryRequestHandler(dp, registry).register(app, path=BOT_WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    
+    # Токены ботов находятся в пути запроса, поэтому access-лог отключен
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, BOT_WEBAPP_HOST, BOT_WEBAPP_PORT).start()
+        logger.info(f"Webhook-сервер запущен на {BOT_WEBAPP_HOST}:{BOT_WEBAPP_PORT}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 async def main():
     """Основная функция запуска бота"""
     # Регистрация функций запуска и завершения
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
+    if BOT_WEBHOOK_BASE_URL:
+        # Мультибот-режим: общая сессия закрывается обработчиком webhook'ов
+        await run_webhook()
+        return
+    
     try:
         # Запуск бота
         await dp.start_polling(bot)
@@ -44,3 +44,37 @@ SUPER_ADMIN_ID = os.getenv("SUPER_ADMIN_ID", "1808397020")
 # 3. Скопируйте полученный file_id и вставьте его сюда
 # WELCOME_PHOTO_ID = "AgACAgIAAxkBAAOaZ77oD4-Tgy3CNspW1TRqpMPUd64AAsHuMRtYrPhJSKZYXBQpBagBAAMCAAN5AAM2BA"
 WELCOME_PHOTO_ID = None  # Временно отключено
+
+# Трекер активности пользователей
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+ACTIVITY_FLUSH_SIZE = int(os.getenv("ACTIVITY_FLUSH_SIZE", "1000"))
+ACTIVITY_MAX_BUFFER = int(os.getenv("ACTIVITY_MAX_BUFFER", "50000"))
+
+# Массовый импорт пользователей
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+# Размер кэша содержимого сообщений для пропуска повторных edit_text
+EDIT_CACHE_SIZE = int(os.getenv("EDIT_CACHE_SIZE", "10000"))
+
+# Настройки ботов
+BOT_SETTINGS_COLLECTION = os.getenv("BOT_SETTINGS_COLLECTION", "bot_settings")
+BOTS_COLLECTION = os.getenv("BOTS_COLLECTION", "bots")
+
+# Мультибот-режим: все боты обслуживаются одним webhook-сервером.
+# Если BOT_WEBHOOK_BASE_URL не задан, основной бот работает через polling
+BOT_WEBHOOK_BASE_URL = os.getenv("BOT_WEBHOOK_BASE_URL")
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "/webhook/bot/{bot_token}")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET")
+BOT_WEBAPP_HOST = os.getenv("BOT_WEBAPP_HOST", "0.0.0.0")
+BOT_WEBAPP_PORT = int(os.getenv("BOT_WEBAPP_PORT", "8000"))
+BOTS_REFRESH_INTERVAL = float(os.getenv("BOTS_REFRESH_INTERVAL", "30"))
+
+# Реферальная система
+REFERRALS_COLLECTION = os.getenv("REFERRALS_COLLECTION", "referrals")
+REFERRAL_FLUSH_INTERVAL = float(os.getenv("REFERRAL_FLUSH_INTERVAL", "2"))
+REFERRAL_FLUSH_SIZE = int(os.getenv("REFERRAL_FLUSH_SIZE", "500"))
+REFERRAL_MAX_BUFFER = int(os.getenv("REFERRAL_MAX_BUFFER", "50000"))
+
+# Адрес Bot API (по умолчанию api.telegram.org). Для нагрузочных тестов
+# указывает на локальный фейковый сервер, например http://127.0.0.1:8081
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL")
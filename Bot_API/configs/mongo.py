@@ -0,0 +1,7 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from configs.config import MONGO_URI, DB_NAME
+
+# Единый асинхронный клиент MongoDB (и пул соединений) на весь процесс,
+# общий для всех ботов и модулей
+client = AsyncIOMotorClient(MONGO_URI)
+db = client[DB_NAME]
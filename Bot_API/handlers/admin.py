@@ -1,113 +1,86 @@
+import csv
+import os
+import tempfile
+import time
 from aiogram import Bot, Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from motor.motor_asyncio import AsyncIOMotorClient
 
-from configs.config import (
-    MONGO_URI,
-    DB_NAME,
-    SUPERUSER_COLLECTION
-)
-from keyboards.keyboards import get_admin_keyboard, get_webapp_keyboard, get_admins_list_keyboard
+from configs.config import USERS_COLLECTION, USERS_PROFILE_COLLECTION
+from configs.mongo import db
+from keyboards.keyboards import get_admin_keyboard, get_webapp_keyboard, get_admins_list_keyboard, get_cancel_keyboard
 from handlers.start import WELCOME_TEXT
-
-# Кэш для video_id
-welcome_video_id_cache = None
-
-# Коллекция для настроек бота
-BOT_SETTINGS_COLLECTION = "bot_settings"
+from utils.bulk_import import import_users
+from utils.dispatch import DispatchIndex
+from utils.response import edit_text
+from utils.tenants import is_tenant, is_admin, get_admins, add_admin, remove_admin, save_welcome_video_id
 
 class AdminStates(StatesGroup):
+    waiting_admin_id = State()
     waiting_for_video = State()
+    waiting_for_import = State()
 
 # Создаем роутер для админ-команд
 admin_router = Router(name="admin_router")
 
-# Инициализация подключения к MongoDB
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
-superuser_collection = db[SUPERUSER_COLLECTION]
-bot_settings_collection = db[BOT_SETTINGS_COLLECTION]
+# Сообщения попадают в роутер только в состояниях AdminStates, callback'и —
+# только с callback_data, зарегистрированными хендлерами через admin_index
+admin_index = DispatchIndex(states=AdminStates)
+admin_router.message.filter(admin_index)
+admin_router.callback_query.filter(admin_index)
 
-async def load_welcome_video_id():
-    """Загружает video_id из БД и сохраняет в кэш"""
-    global welcome_video_id_cache
-    try:
-        settings = await bot_settings_collection.find_one({"key": "welcome_video_id"})
-        if settings:
-            welcome_video_id_cache = settings.get("value")
-            print(f"✅ Вступительное видео загружено из БД: {welcome_video_id_cache}")
-        else:
-            welcome_video_id_cache = None
-            print("ℹ️ Вступительное видео не найдено в БД")
-    except Exception as e:
-        print(f"❌ Ошибка при загрузке video_id: {e}")
-        welcome_video_id_cache = None
+# Коллекции MongoDB (общий клиент процесса)
+users_collection = db[USERS_COLLECTION]
+users_profile_collection = db[USERS_PROFILE_COLLECTION]
 
-async def save_welcome_video_id(video_id: str):
-    """Сохраняет video_id в БД и обновляет кэш"""
-    global welcome_video_id_cache
-    try:
-        await bot_settings_collection.update_one(
-            {"key": "welcome_video_id"},
-            {"$set": {"key": "welcome_video_id", "value": video_id}},
-            upsert=True
-        )
-        welcome_video_id_cache = video_id
-        print(f"✅ Вступительное видео сохранено в БД и кэш обновлен: {video_id}")
-    except Exception as e:
-        print(f"❌ Ошибка при сохранении video_id: {e}")
+# Минимальный интервал между обновлениями прогресса импорта (секунды)
+IMPORT_PROGRESS_INTERVAL = 3
 
-@admin_router.callback_query(F.data == "admin_panel")
-async def admin_panel_handler(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(admin_index.callback("admin_panel"))
+async def admin_panel_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Обработчик открытия админ-панели"""
     user_id = callback.from_user.id
     telegram_id = str(user_id)
     
-    # Проверяем, является ли пользователь админом
-    is_superuser = await superuser_collection.find_one({"telegramID": telegram_id})
-    
-    if not is_superuser:
+    # Проверяем, является ли пользователь админом этого бота
+    if not await is_admin(bot, telegram_id):
         await callback.answer("У вас нет прав администратора.", show_alert=True)
         return
     
     # Отправляем админ-панель
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "Панель администратора",
         reply_markup=get_admin_keyboard()
     )
 
-@admin_router.callback_query(F.data == "back_to_menu")
+@admin_router.callback_query(admin_index.callback("back_to_menu"))
 async def back_to_menu_handler(callback: CallbackQuery, state: FSMContext):
     """Обработчик возврата в главное меню"""
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         WELCOME_TEXT,
         parse_mode="HTML",
         reply_markup=get_webapp_keyboard(is_admin=True)
     )
 
-@admin_router.callback_query(F.data == "add_admin")
+@admin_router.callback_query(admin_index.callback("add_admin"))
 async def add_admin_handler(callback: CallbackQuery, state: FSMContext):
     """Обработчик добавления админа"""
-    await state.set_state("waiting_admin_id")
+    await state.set_state(AdminStates.waiting_admin_id)
     # Сохраняем сообщение в состоянии
     await state.update_data(last_bot_message=callback.message)
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "Отправьте Telegram ID пользователя, которого хотите сделать администратором.\n\n"
         "ID должен содержать только цифры.",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="◀️ ОТМЕНА", callback_data="back_to_admin")]
-        ])
+        reply_markup=get_cancel_keyboard()
     )
 
-@admin_router.message(lambda m: m.text)
-async def process_admin_id(message: Message, state: FSMContext):
+@admin_router.message(AdminStates.waiting_admin_id, F.text)
+async def process_admin_id(message: Message, state: FSMContext, bot: Bot):
     """Обработчик получения ID нового админа"""
-    current_state = await state.get_state()
-    if current_state != "waiting_admin_id":
-        return
-    
     # Удаляем сообщение с ID в любом случае
     await message.delete()
     
@@ -117,123 +90,113 @@ async def process_admin_id(message: Message, state: FSMContext):
     
     # Проверяем, что сообщение содержит только цифры
     if not message.text.isdigit():
-        await last_bot_message.edit_text(
+        await edit_text(
+            last_bot_message,
             "❌ ID должен содержать только цифры. Попробуйте еще раз или нажмите 'Отмена'.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="◀️ ОТМЕНА", callback_data="back_to_admin")]
-            ])
+            reply_markup=get_cancel_keyboard()
         )
         return
     
     new_admin_id = message.text
     
-    # Проверяем, не является ли пользователь уже админом
-    existing_admin = await superuser_collection.find_one({"telegramID": new_admin_id})
-    if existing_admin:
-        await last_bot_message.edit_text(
+    # Добавляем нового админа, если он еще не админ
+    if not await add_admin(bot, new_admin_id):
+        await edit_text(
+            last_bot_message,
             f"❌ Пользователь {new_admin_id} уже является администратором.",
             reply_markup=get_admin_keyboard()
         )
         await state.clear()
         return
     
-    # Добавляем нового админа
-    await superuser_collection.update_one(
-        {"telegramID": new_admin_id},
-        {"$set": {"telegramID": new_admin_id}},
-        upsert=True
-    )
-    
-    await last_bot_message.edit_text(
+    await edit_text(
+        last_bot_message,
         f"✅ Пользователь {new_admin_id} успешно добавлен как администратор.",
         reply_markup=get_admin_keyboard()
     )
     await state.clear()
 
-@admin_router.callback_query(F.data == "remove_admin")
-async def remove_admin_handler(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(admin_index.callback("remove_admin"))
+async def remove_admin_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Обработчик удаления админа"""
     # Получаем список всех админов
-    admins = await superuser_collection.find().to_list(length=None)
+    admins = await get_admins(bot)
     
     if not admins:
         await callback.answer("Список администраторов пуст", show_alert=True)
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "Выберите администратора для удаления:",
         reply_markup=get_admins_list_keyboard(admins)
     )
 
-@admin_router.callback_query(F.data.startswith("delete_admin_"))
-async def process_delete_admin(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(admin_index.callback_prefix("delete_admin_"))
+async def process_delete_admin(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Обработчик удаления выбранного админа"""
     admin_id = callback.data.replace("delete_admin_", "")
     
     # Удаляем админа
-    result = await superuser_collection.delete_one({"telegramID": admin_id})
-    
-    if result.deleted_count > 0:
+    if await remove_admin(bot, admin_id):
         await callback.answer(f"Администратор {admin_id} удален", show_alert=True)
     else:
         await callback.answer(f"Администратор с ID {admin_id} не найден", show_alert=True)
     
     # Обновляем список админов
-    admins = await superuser_collection.find().to_list(length=None)
+    admins = await get_admins(bot)
     
     if not admins:
-        await callback.message.edit_text(
+        await edit_text(
+            callback.message,
             "Список администраторов пуст",
             reply_markup=get_admin_keyboard()
         )
     else:
-        await callback.message.edit_text(
+        await edit_text(
+            callback.message,
             "Выберите администратора для удаления:",
             reply_markup=get_admins_list_keyboard(admins)
         )
 
-@admin_router.callback_query(F.data == "back_to_admin")
+@admin_router.callback_query(admin_index.callback("back_to_admin"))
 async def back_to_admin(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "Панель администратора",
         reply_markup=get_admin_keyboard()
     )
 
-@admin_router.callback_query(F.data == "change_welcome_video")
-async def change_welcome_video_handler(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(admin_index.callback("change_welcome_video"))
+async def change_welcome_video_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Обработчик изменения вступительного видео"""
     user_id = callback.from_user.id
     telegram_id = str(user_id)
     
-    # Проверяем, является ли пользователь админом
-    is_superuser = await superuser_collection.find_one({"telegramID": telegram_id})
-    
-    if not is_superuser:
+    # Проверяем, является ли пользователь админом этого бота
+    if not await is_admin(bot, telegram_id):
         await callback.answer("У вас нет прав администратора.", show_alert=True)
         return
     
     await state.set_state(AdminStates.waiting_for_video)
     await state.update_data(last_bot_message=callback.message)
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "Отправьте видео файл, которое будет использоваться как вступительное видео при команде /start.\n\n"
         "Видео должно быть в формате MP4.",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="◀️ ОТМЕНА", callback_data="back_to_admin")]
-        ])
+        reply_markup=get_cancel_keyboard()
     )
 
 @admin_router.message(AdminStates.waiting_for_video, F.video)
-async def process_welcome_video(message: Message, state: FSMContext):
+async def process_welcome_video(message: Message, state: FSMContext, bot: Bot):
     """Обработчик получения видео файла"""
     user_id = message.from_user.id
     telegram_id = str(user_id)
     
-    # Проверяем, является ли пользователь админом
-    is_superuser = await superuser_collection.find_one({"telegramID": telegram_id})
-    
-    if not is_superuser:
+    # Проверяем, является ли пользователь админом этого бота
+    if not await is_admin(bot, telegram_id):
         await message.answer("У вас нет прав администратора.")
         await state.clear()
         return
@@ -247,7 +210,7 @@ async def process_welcome_video(message: Message, state: FSMContext):
     video_id = video.file_id
     
     # Сохраняем в БД и обновляем кэш
-    await save_welcome_video_id(video_id)
+    await save_welcome_video_id(bot, video_id)
     
     # Удаляем сообщение с видео
     await message.delete()
@@ -257,7 +220,8 @@ async def process_welcome_video(message: Message, state: FSMContext):
     last_bot_message = state_data.get('last_bot_message')
     
     if last_bot_message:
-        await last_bot_message.edit_text(
+        await edit_text(
+            last_bot_message,
             f"✅ Вступительное видео успешно обновлено!\n\n"
             f"File ID: {video_id}",
             reply_markup=get_admin_keyboard()
@@ -272,9 +236,132 @@ async def process_welcome_video_invalid(message: Message, state: FSMContext):
     last_bot_message = state_data.get('last_bot_message')
     
     if last_bot_message:
-        await last_bot_message.edit_text(
+        await edit_text(
+            last_bot_message,
             "❌ Пожалуйста, отправьте видео файл (MP4).",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="◀️ ОТМЕНА", callback_data="back_to_admin")]
-            ])
-        ) 
\ No newline at end of file
+            reply_markup=get_cancel_keyboard()
+        )
+
+@admin_router.callback_query(admin_index.callback("import_users"))
+async def import_users_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    """Обработчик массового импорта пользователей"""
+    user_id = callback.from_user.id
+    telegram_id = str(user_id)
+    
+    # Проверяем, является ли пользователь админом этого бота
+    if not await is_admin(bot, telegram_id):
+        await callback.answer("У вас нет прав администратора.", show_alert=True)
+        return
+    
+    # Импорт выдает доступ к основному приложению, клиентским ботам он недоступен
+    if is_tenant(bot):
+        await callback.answer("Импорт доступен только в основном боте.", show_alert=True)
+        return
+    
+    await state.set_state(AdminStates.waiting_for_import)
+    await state.update_data(last_bot_message=callback.message)
+    
+    await edit_text(
+        callback.message,
+        "Отправьте CSV или XLSX файл со списком пользователей.\n\n"
+        "Колонки: telegramID, name, username (заголовок необязателен).\n"
+        "Всем пользователям из файла будет выдан доступ и продлена подписка.",
+        reply_markup=get_cancel_keyboard()
+    )
+
+@admin_router.message(AdminStates.waiting_for_import, F.document)
+async def process_import_file(message: Message, state: FSMContext, bot: Bot):
+    """Обработчик получения файла для импорта пользователей"""
+    user_id = message.from_user.id
+    telegram_id = str(user_id)
+    
+    # Проверяем, является ли пользователь админом этого бота
+    if not await is_admin(bot, telegram_id):
+        await message.answer("У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    document = message.document
+    file_name = document.file_name or ""
+    if not file_name.lower().endswith((".csv", ".xlsx")):
+        await message.answer("❌ Поддерживаются только файлы CSV и XLSX.")
+        return
+    
+    await state.clear()
+    progress_message = await message.answer(f"⏳ Импорт {file_name} начат...")
+    
+    fd, source_path = tempfile.mkstemp(suffix=os.path.splitext(file_name)[1])
+    os.close(fd)
+    fd, report_path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    last_progress = time.monotonic()
+    
+    async def on_progress(stats):
+        """Периодически обновляет сообщение с прогрессом"""
+        nonlocal last_progress
+        if time.monotonic() - last_progress < IMPORT_PROGRESS_INTERVAL:
+            return
+        last_progress = time.monotonic()
+        # Ошибка обновления прогресса (429, сеть, удаленное сообщение) не должна прерывать импорт
+        try:
+            await edit_text(
+                progress_message,
+                f"⏳ Импорт {file_name}: обработано {stats['processed']}, "
+                f"импортировано {stats['imported']}, ошибок {stats['errors']}"
+            )
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить прогресс импорта: {e}")
+    
+    try:
+        await bot.download(document, destination=source_path)
+        
+        with open(report_path, "w", newline="", encoding="utf-8") as report:
+            error_writer = csv.writer(report)
+            error_writer.writerow(["row", "error"])
+            stats = await import_users(
+                source_path,
+                file_name,
+                users_collection,
+                users_profile_collection,
+                error_writer,
+                on_progress=on_progress
+            )
+        
+        await edit_text(
+            progress_message,
+            f"✅ Импорт {file_name} завершен.\n\n"
+            f"Обработано строк: {stats['processed']}\n"
+            f"Импортировано: {stats['imported']}\n"
+            f"Ошибок: {stats['errors']}",
+            reply_markup=get_admin_keyboard()
+        )
+        
+        # Отправляем отчет об ошибках по строкам
+        if stats["errors"]:
+            await message.answer_document(
+                FSInputFile(report_path, filename="import_errors.csv"),
+                caption="Отчет об ошибках импорта"
+            )
+    except Exception as e:
+        print(f"❌ Ошибка при импорте пользователей: {e}")
+        await edit_text(
+            progress_message,
+            f"❌ Ошибка при импорте: {e}",
+            reply_markup=get_admin_keyboard()
+        )
+    finally:
+        os.remove(source_path)
+        os.remove(report_path)
+
+@admin_router.message(AdminStates.waiting_for_import)
+async def process_import_file_invalid(message: Message, state: FSMContext):
+    """Обработчик неверного типа сообщения при ожидании файла импорта"""
+    state_data = await state.get_data()
+    last_bot_message = state_data.get('last_bot_message')
+    
+    if last_bot_message:
+        await edit_text(
+            last_bot_message,
+            "❌ Пожалуйста, отправьте файл CSV или XLSX.",
+            reply_markup=get_cancel_keyboard()
+        )
@@ -1,16 +1,11 @@
 from aiogram import Bot, Router
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from motor.motor_asyncio import AsyncIOMotorClient
 
-from configs.config import (
-    MONGO_URI,
-    DB_NAME,
-    SUPERUSER_COLLECTION,
-    MINIAPP_URL
-)
 from keyboards.keyboards import get_webapp_keyboard
+from utils.tenants import is_tenant, is_admin, get_welcome_video_id
+from utils.referrals import parse_referral_payload, referral_recorder
 
 # Создаем роутер для команды start
 start_router = Router(name="start_router")
@@ -34,30 +29,36 @@ What's coming soon:
 
 We're not another short-lived "hack." FABRICBOT is built on trust, speed, and simplicity — a solid tool to grow your business in the new digital economy."""
 
-# Инициализация подключения к MongoDB
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
-superuser_collection = db[SUPERUSER_COLLECTION]
-
 @start_router.message(Command("start"))
-async def start_command_handler(message: Message, state: FSMContext, bot: Bot):
+async def start_command_handler(message: Message, state: FSMContext, bot: Bot, command: CommandObject):
     """Обработчик команды /start"""
     user_id = message.from_user.id
     telegram_id = str(user_id)
     
-    # Проверяем, является ли пользователь админом
-    is_superuser = await superuser_collection.find_one({"telegramID": telegram_id})
+    # Реферальная ссылка вида /start ref<ID> привязывает только нового пользователя,
+    # /start без ссылки регистрирует его корнем дерева. Запись идет пачкой в фоне
+    referral_recorder.capture(
+        bot.id,
+        telegram_id,
+        parse_referral_payload(command.args),
+        name=message.from_user.full_name,
+        username=message.from_user.username or "",
+        check_profile=not is_tenant(bot)
+    )
+    
+    # Проверяем, является ли пользователь админом этого бота
+    is_superuser = await is_admin(bot, telegram_id)
     
     # Создаем клавиатуру с кнопкой приложения
-    keyboard = get_webapp_keyboard(is_admin=bool(is_superuser))
+    keyboard = get_webapp_keyboard(is_admin=is_superuser)
     
-    # Импортируем кэш для video_id
-    from handlers.admin import welcome_video_id_cache
+    # Вступительное видео этого бота из кэша
+    welcome_video_id = get_welcome_video_id(bot)
     
     # Если есть вступительное видео, отправляем его вместе с текстом
-    if welcome_video_id_cache:
+    if welcome_video_id:
         await message.answer_video(
-            video=welcome_video_id_cache,
+            video=welcome_video_id,
             caption=WELCOME_TEXT,
             parse_mode="HTML",
             reply_markup=keyboard
@@ -1,7 +1,13 @@
+from functools import lru_cache
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
 from configs.config import MINIAPP_URL
 
+# Статические клавиатуры собираются один раз и переиспользуются всеми запросами.
+# Объекты aiogram изменяемы, поэтому закэшированные клавиатуры нельзя менять
+# на месте: для вариаций собирайте новую разметку
+
 # Основная клавиатура с кнопкой входа в MiniApp
+@lru_cache(maxsize=None)
 def get_webapp_keyboard(is_admin: bool = False) -> InlineKeyboardMarkup:
     """Создает клавиатуру с кнопкой приложения"""
     keyboard = [
@@ -30,6 +36,7 @@ def get_webapp_keyboard(is_admin: bool = False) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@lru_cache(maxsize=None)
 def get_admin_keyboard() -> InlineKeyboardMarkup:
     """Создает клавиатуру для админ-панели"""
     keyboard = [
@@ -51,6 +58,12 @@ def get_admin_keyboard() -> InlineKeyboardMarkup:
                 callback_data="change_welcome_video"
             )
         ],
+        [
+            InlineKeyboardButton(
+                text="📥 ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ",
+                callback_data="import_users"
+            )
+        ],
         [
             InlineKeyboardButton(
                 text="◀️ НАЗАД",
@@ -82,6 +95,7 @@ def get_admins_list_keyboard(admins: list) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@lru_cache(maxsize=None)
 def get_back_keyboard() -> InlineKeyboardMarkup:
     """Создает клавиатуру с кнопкой возврата"""
     keyboard = [
@@ -95,3 +109,17 @@ def get_back_keyboard() -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@lru_cache(maxsize=None)
+def get_cancel_keyboard() -> InlineKeyboardMarkup:
+    """Создает клавиатуру с кнопкой отмены ввода"""
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                text="◀️ ОТМЕНА",
+                callback_data="back_to_admin"
+            )
+        ]
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject, Update, User
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, NetworkTimeout
+
+from configs.config import (
+    USERS_PROFILE_COLLECTION,
+    ACTIVITY_FLUSH_INTERVAL,
+    ACTIVITY_FLUSH_SIZE,
+    ACTIVITY_MAX_BUFFER
+)
+from configs.mongo import db
+from utils.tenants import is_tenant
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Коллекция профилей (общий клиент процесса)
+users_profile_collection = db[USERS_PROFILE_COLLECTION]
+
+
+class ActivityTracker(BaseMiddleware):
+    """
+    Накапливает активность пользователей в памяти и периодически
+    сбрасывает её в профили одним неупорядоченным bulk_write.
+
+    Профили не создаются: их заводит create_or_update_profile вместе с
+    подпиской, поэтому активность пользователей без профиля намеренно
+    не сохраняется и учитывается в метрике unmatched.
+
+    Профили принадлежат основному приложению, поэтому учитываются только
+    обновления основного бота: активность клиентских ботов пропускается.
+    """
+
+    def __init__(
+        self,
+        collection=users_profile_collection,
+        flush_interval: float = ACTIVITY_FLUSH_INTERVAL,
+        flush_size: int = ACTIVITY_FLUSH_SIZE,
+        max_buffer: int = ACTIVITY_MAX_BUFFER
+    ):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+
+        # (bot_id, telegramID) -> {"lastSeen", "startCount", "interactionCount"}
+        self._buffer: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._pending = None
+
+        # Метрики трекера
+        self.stats = {
+            "flushes": 0,
+            "written": 0,
+            "unmatched": 0,
+            "failed": 0,
+            "requeued": 0,
+            "dropped": 0
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        bot: Bot = data.get("bot")
+        if user and bot and not is_tenant(bot):
+            is_start = (
+                isinstance(event, Update)
+                and event.message is not None
+                and (event.message.text or "").startswith("/start")
+            )
+            self.track(bot.id, str(user.id), is_start=is_start)
+        return await handler(event, data)
+
+    def track(self, bot_id: int, telegram_id: str, is_start: bool = False):
+        """Учитывает одно обновление пользователя в буфере"""
+        key = (bot_id, telegram_id)
+        entry = self._buffer.get(key)
+        if entry is None:
+            if len(self._buffer) >= self.max_buffer:
+                # Буфер переполнен: теряем событие, но не растем бесконечно
+                self.stats["dropped"] += 1
+                if self.stats["dropped"] % 1000 == 1:
+                    logger.warning(f"⚠️ Буфер активности переполнен, событий отброшено: {self.stats['dropped']}")
+                return
+            entry = self._buffer[key] = {"startCount": 0, "interactionCount": 0}
+
+        entry["lastSeen"] = datetime.now()
+        entry["interactionCount"] += 1
+        if is_start:
+            entry["startCount"] += 1
+
+        if len(self._buffer) >= self.flush_size and (self._pending is None or self._pending.done()):
+            self._pending = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Сбрасывает накопленные счетчики в MongoDB"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+
+            buffer, self._buffer = self._buffer, {}
+            operations = [
+                UpdateOne(
+                    {"telegramID": telegram_id},
+                    {
+                        "$max": {"lastSeen": entry["lastSeen"]},
+                        "$inc": {
+                            "startCount": entry["startCount"],
+                            "interactionCount": entry["interactionCount"]
+                        }
+                    }
+                )
+                for (_, telegram_id), entry in buffer.items()
+            ]
+
+            try:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                matched, failed = result.matched_count, 0
+            except BulkWriteError as e:
+                # Частичная ошибка: остальные операции применены
+                matched = e.details.get("nMatched", 0)
+                failed = len(e.details.get("writeErrors", []))
+                logger.error(f"❌ Ошибка при сбросе активности пользователей: {failed} операций не применено")
+            except AutoReconnect as e:
+                if isinstance(e, NetworkTimeout):
+                    # Запрос мог быть применен: повтор посчитал бы $inc дважды
+                    self.stats["failed"] += len(operations)
+                else:
+                    # Сервер недоступен, запрос не отправлен: возвращаем счетчики в буфер
+                    self._requeue(buffer)
+                logger.error(f"❌ Ошибка при сбросе активности пользователей: {e}")
+                matched, failed = 0, None
+            except Exception as e:
+                self.stats["failed"] += len(operations)
+                logger.error(f"❌ Ошибка при сбросе активности пользователей: {e}")
+                matched, failed = 0, None
+
+            if failed is not None:
+                self.stats["written"] += matched
+                self.stats["failed"] += failed
+                self.stats["unmatched"] += len(operations) - matched - failed
+            self.stats["flushes"] += 1
+            logger.debug(f"Активность сброшена: {len(operations)} пользователей, метрики: {self.stats}")
+            return len(operations)
+
+    def _requeue(self, buffer):
+        """Возвращает неотправленные счетчики в буфер в пределах max_buffer"""
+        for key, entry in buffer.items():
+            current = self._buffer.get(key)
+            if current is not None:
+                current["lastSeen"] = max(current["lastSeen"], entry["lastSeen"])
+                current["startCount"] += entry["startCount"]
+                current["interactionCount"] += entry["interactionCount"]
+            elif len(self._buffer) < self.max_buffer:
+                self._buffer[key] = entry
+            else:
+                self.stats["dropped"] += 1
+                continue
+            self.stats["requeued"] += 1
+
+    async def _flush_loop(self):
+        """Периодически сбрасывает буфер по таймеру"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Запускает фоновый сброс буфера"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Останавливает фоновый сброс и записывает остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Трекер активности остановлен, метрики: {self.stats}")
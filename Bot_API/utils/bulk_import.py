@@ -0,0 +1,231 @@
+import asyncio
+import codecs
+import csv
+import logging
+from datetime import datetime, timedelta
+from openpyxl import load_workbook
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from configs.config import SUBSCRIPTION_DAYS, IMPORT_BATCH_SIZE
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Допустимые названия колонок в заголовке файла
+ID_COLUMNS = {"telegramid", "telegram_id", "id", "user_id"}
+NAME_COLUMNS = {"name", "имя"}
+USERNAME_COLUMNS = {"username", "login", "логин"}
+
+# Разделители CSV, которые встречаются в выгрузках (Excel в русской локали пишет ";")
+CSV_DELIMITERS = ",;\t"
+
+# Кодировка CSV, если файл не является UTF-8 (Excel в русской локали)
+CSV_FALLBACK_ENCODING = "cp1251"
+
+
+def detect_encoding(path):
+    """Определяет кодировку CSV по началу файла: UTF-8 (с BOM или без) или cp1251"""
+    with open(path, "rb") as f:
+        sample = f.read(64 * 1024)
+    try:
+        # final=False: последний символ мог быть обрезан границей выборки
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return CSV_FALLBACK_ENCODING
+    return "utf-8-sig"
+
+
+def iter_csv_rows(path):
+    """Построчно читает CSV-файл, определяя кодировку и разделитель по первым строкам"""
+    # Некорректные байты дальше по файлу заменяются, и строка попадает в отчет, а не обрывает импорт
+    with open(path, newline="", encoding=detect_encoding(path), errors="replace") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            # Sniffer не справляется с разным числом полей и пустыми строками,
+            # поэтому берем самый частый разделитель первой строки
+            first_line = sample.splitlines()[0] if sample else ""
+            delimiter = max(CSV_DELIMITERS, key=first_line.count)
+            yield from csv.reader(f, csv.excel, delimiter=delimiter if delimiter in first_line else ",")
+            return
+        yield from csv.reader(f, dialect)
+
+
+def iter_xlsx_rows(path):
+    """Построчно читает первый лист XLSX-файла в режиме read-only"""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(path, file_name):
+    """Выбирает читатель строк по расширению файла"""
+    if file_name.lower().endswith(".xlsx"):
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path)
+
+
+def normalize_cell(value):
+    """Приводит значение ячейки к строке (Excel хранит числа как float)"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def detect_columns(row):
+    """Возвращает индексы колонок (id, name, username), если строка является заголовком"""
+    header = [normalize_cell(cell).lower() for cell in row]
+    if not any(cell in ID_COLUMNS for cell in header):
+        return None
+
+    def find(names, default):
+        for index, cell in enumerate(header):
+            if cell in names:
+                return index
+        return default
+
+    return find(ID_COLUMNS, 0), find(NAME_COLUMNS, None), find(USERNAME_COLUMNS, None)
+
+
+def build_operations(telegram_id, name, username, now):
+    """Формирует upsert-операции для users и profiles по одной строке"""
+    user_op = UpdateOne(
+        {"telegramID": telegram_id},
+        {"$set": {"isAccepted": True}},
+        upsert=True
+    )
+
+    # Та же логика, что и в create_or_update_profile, но одним запросом:
+    # активная подписка продлевается, истекшая начинается с текущей даты
+    profile_op = UpdateOne(
+        {"telegramID": telegram_id},
+        [{"$set": {
+            "name": {"$ifNull": ["$name", name or "Аноним"]},
+            "username": {"$ifNull": ["$username", username]},
+            "totalLessonScore": {"$ifNull": ["$totalLessonScore", 0]},
+            "bonusScore": {"$ifNull": ["$bonusScore", 0]},
+            "isNew": {"$eq": [{"$type": "$name"}, "missing"]},
+            "expireDate": {"$cond": [
+                {"$gt": ["$expireDate", now]},
+                {"$add": ["$expireDate", SUBSCRIPTION_DAYS * 24 * 60 * 60 * 1000]},
+                now + timedelta(days=SUBSCRIPTION_DAYS)
+            ]}
+        }}],
+        upsert=True
+    )
+    return user_op, profile_op
+
+
+async def write_batch(users_collection, users_profile_collection, batch):
+    """Записывает пачку строк и возвращает ошибки записи в виде (номер строки, текст)"""
+    user_ops = [ops[0] for _, ops in batch]
+    profile_ops = [ops[1] for _, ops in batch]
+    results = await asyncio.gather(
+        users_collection.bulk_write(user_ops, ordered=False),
+        users_profile_collection.bulk_write(profile_ops, ordered=False),
+        return_exceptions=True
+    )
+
+    errors = {}
+    for result in results:
+        if isinstance(result, BulkWriteError):
+            for write_error in result.details.get("writeErrors", []):
+                row_number = batch[write_error["index"]][0]
+                errors[row_number] = write_error.get("errmsg", "Ошибка записи")
+        elif isinstance(result, Exception):
+            for row_number, _ in batch:
+                errors.setdefault(row_number, str(result))
+    return list(errors.items())
+
+
+async def import_users(
+    path,
+    file_name,
+    users_collection,
+    users_profile_collection,
+    error_writer,
+    on_progress=None,
+    batch_size=IMPORT_BATCH_SIZE
+):
+    """
+    Потоково импортирует пользователей из CSV/XLSX и выдает им доступ.
+    Ошибки по строкам пишутся в error_writer (csv.writer). Строки файла в памяти
+    не накапливаются, хранятся только уже встреченные Telegram ID.
+    """
+    now = datetime.now()
+    stats = {"processed": 0, "imported": 0, "errors": 0}
+    # Без заголовка: id, имя, username по порядку
+    columns = (0, 1, 2)
+    batch = []
+    # Telegram ID -> номер строки, где он встретился впервые (по всему файлу):
+    # каждая строка продлевает подписку, поэтому повторы не записываются
+    seen_ids = {}
+    pending = None
+
+    def report_error(row_number, message):
+        stats["errors"] += 1
+        error_writer.writerow([row_number, message])
+
+    async def finish_pending():
+        nonlocal pending
+        if pending is None:
+            return
+        (written_batch, task), pending = pending, None
+        written, write_errors = len(written_batch), await task
+        for row_number, message in write_errors:
+            report_error(row_number, message)
+        stats["imported"] += written - len(write_errors)
+
+    try:
+        for row_number, row in enumerate(iter_rows(path, file_name), start=1):
+            if row_number == 1:
+                header = detect_columns(row)
+                if header:
+                    columns = header
+                    continue
+
+            id_index, name_index, username_index = columns
+            cells = [normalize_cell(cell) for cell in row]
+            if not any(cells):
+                continue
+
+            stats["processed"] += 1
+            telegram_id = cells[id_index] if id_index < len(cells) else ""
+            if not telegram_id.isdigit():
+                report_error(row_number, f"Некорректный Telegram ID: {telegram_id!r}")
+                continue
+
+            if telegram_id in seen_ids:
+                report_error(row_number, f"Повтор Telegram ID {telegram_id} (строка {seen_ids[telegram_id]})")
+                continue
+            seen_ids[telegram_id] = row_number
+
+            name = cells[name_index] if name_index is not None and name_index < len(cells) else ""
+            username = cells[username_index] if username_index is not None and username_index < len(cells) else ""
+            batch.append((row_number, build_operations(telegram_id, name, username.lstrip("@"), now)))
+
+            if len(batch) >= batch_size:
+                # Пока пишется текущая пачка, разбираем следующую
+                await finish_pending()
+                pending = (batch, asyncio.ensure_future(write_batch(users_collection, users_profile_collection, batch)))
+                batch = []
+                # Отдаем управление, чтобы запрос ушел в MongoDB до разбора следующей пачки
+                await asyncio.sleep(0)
+                if on_progress:
+                    await on_progress(stats)
+
+        if batch:
+            await finish_pending()
+            pending = (batch, asyncio.ensure_future(write_batch(users_collection, users_profile_collection, batch)))
+    finally:
+        # Пачка в полете дожидается записи, даже если разбор или прогресс упали
+        await finish_pending()
+
+    logger.info(f"Импорт пользователей из {file_name} завершен: {stats}")
+    return stats
@@ -0,0 +1,45 @@
+from typing import Iterable, Optional, Type
+from aiogram import F
+from aiogram.filters import Filter
+from aiogram.fsm.state import StatesGroup
+from aiogram.types import CallbackQuery, Message
+
+
+class DispatchIndex(Filter):
+    """
+    Фильтр уровня роутера: пропускает в роутер только обновления, которые
+    могут обработать его хендлеры. Проверка — поиск по множеству FSM-состояний
+    и callback_data (точное значение или префикс), без обращений к хранилищу:
+    raw_state уже загружен FSM-middleware диспетчера.
+
+    Callback'и регистрируются через callback()/callback_prefix() прямо в
+    декораторах хендлеров, поэтому индекс не расходится с их фильтрами.
+    """
+
+    def __init__(
+        self,
+        states: Optional[Type[StatesGroup]] = None,
+        callbacks: Iterable[str] = (),
+        prefixes: Iterable[str] = ()
+    ):
+        self.states = frozenset(states.__all_states_names__) if states else frozenset()
+        self.callbacks = set(callbacks)
+        self.prefixes = tuple(prefixes)
+
+    def callback(self, data: str):
+        """Добавляет callback_data в индекс и возвращает фильтр хендлера"""
+        self.callbacks.add(data)
+        return F.data == data
+
+    def callback_prefix(self, prefix: str):
+        """Добавляет префикс callback_data в индекс и возвращает фильтр хендлера"""
+        self.prefixes += (prefix,)
+        return F.data.startswith(prefix)
+
+    async def __call__(self, event, raw_state: Optional[str] = None) -> bool:
+        if isinstance(event, Message):
+            return raw_state in self.states
+        if isinstance(event, CallbackQuery):
+            data = event.data or ""
+            return data in self.callbacks or data.startswith(self.prefixes)
+        return False
@@ -0,0 +1,161 @@
+import asyncio
+import hmac
+import logging
+from typing import Dict, List, Optional, Set
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import TokenBasedRequestHandler
+from aiohttp import web
+
+from configs.config import BOT_WEBHOOK_BASE_URL, BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET
+from utils.tenants import bots_collection, register_tenant, unregister_tenant
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+
+class BotRegistry:
+    """
+    Реестр ботов процесса: основной бот из BOT_TOKEN плюс клиентские боты
+    из коллекции bots. Все боты используют одну HTTP-сессию.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, main_bot: Bot, session: AiohttpSession):
+        self.dispatcher = dispatcher
+        self.main_bot = main_bot
+        self.session = session
+        self.bots: Dict[str, Bot] = {main_bot.token: main_bot}
+        # Некорректные токены: не перепроверяются при каждом обновлении реестра
+        self.rejected_tokens: Set[str] = set()
+        self._task = None
+
+    def get(self, token: str) -> Optional[Bot]:
+        """Возвращает зарегистрированного бота по токену"""
+        return self.bots.get(token)
+
+    def webhook_url(self, bot: Bot) -> str:
+        """Публичный адрес webhook'а бота"""
+        return BOT_WEBHOOK_BASE_URL.rstrip("/") + BOT_WEBHOOK_PATH.format(bot_token=bot.token)
+
+    async def set_webhook(self, bot: Bot):
+        """Направляет обновления бота на общий webhook-сервер"""
+        await bot.set_webhook(
+            self.webhook_url(bot),
+            secret_token=BOT_WEBHOOK_SECRET,
+            allowed_updates=self.dispatcher.resolve_used_update_types(),
+            drop_pending_updates=False
+        )
+
+    async def add_bot(self, settings: dict):
+        """Подключает клиентского бота без перезапуска процесса"""
+        try:
+            bot = Bot(token=settings["token"], session=self.session)
+        except Exception as e:
+            self.rejected_tokens.add(settings["token"])
+            logger.error(f"❌ Некорректный токен бота {settings.get('_id')}: {e}")
+            return
+        register_tenant(bot.id, settings)
+        try:
+            await self.set_webhook(bot)
+        except Exception as e:
+            unregister_tenant(bot.id)
+            logger.error(f"❌ Не удалось подключить бота {bot.id}: {e}")
+            return
+        self.bots[bot.token] = bot
+        logger.info(f"✅ Бот {bot.id} подключен")
+
+    async def remove_bot(self, token: str):
+        """Отключает клиентского бота и очищает его кэши и FSM-данные"""
+        bot = self.bots.pop(token, None)
+        if bot is None or bot is self.main_bot:
+            return
+        unregister_tenant(bot.id)
+
+        storage = self.dispatcher.storage
+        if isinstance(storage, MemoryStorage):
+            for key in [key for key in storage.storage if key.bot_id == bot.id]:
+                del storage.storage[key]
+
+        try:
+            await bot.delete_webhook()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось удалить webhook бота {bot.id}: {e}")
+        logger.info(f"Бот {bot.id} отключен")
+
+    async def refresh(self):
+        """Синхронизирует реестр с коллекцией bots (добавление, удаление, обновление настроек)"""
+        documents: List[dict] = await bots_collection.find({"isActive": True}).to_list(length=None)
+        active = {document["token"]: document for document in documents if document.get("token")}
+
+        for token in list(self.bots):
+            if token != self.main_bot.token and token not in active:
+                await self.remove_bot(token)
+
+        # Исправленный в документе токен приходит как новый и проверяется заново
+        self.rejected_tokens &= set(active)
+
+        for token, settings in active.items():
+            if token in self.rejected_tokens:
+                continue
+            bot = self.bots.get(token)
+            if bot is None:
+                await self.add_bot(settings)
+            elif bot is not self.main_bot:
+                register_tenant(bot.id, settings)
+
+    async def _refresh_loop(self, interval: float):
+        """Периодически перечитывает список ботов"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при обновлении списка ботов: {e}")
+
+    async def start(self, interval: float):
+        """Настраивает webhook'и и запускает фоновое обновление реестра"""
+        try:
+            await bots_collection.create_index("token", unique=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при создании индекса ботов: {e}")
+        await self.set_webhook(self.main_bot)
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop(self):
+        """Останавливает фоновое обновление реестра"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class RegistryRequestHandler(TokenBasedRequestHandler):
+    """
+    Webhook-обработчик с маршрутизацией по токену в пути. В отличие от
+    TokenBasedRequestHandler принимает только ботов из реестра.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, registry: BotRegistry, **data):
+        super().__init__(dispatcher=dispatcher, **data)
+        self.registry = registry
+
+    async def resolve_bot(self, request: web.Request) -> Bot:
+        bot = self.registry.get(request.match_info["bot_token"])
+        if bot is None:
+            raise web.HTTPNotFound()
+        return bot
+
+    def verify_secret(self, telegram_secret_token: str, bot: Bot) -> bool:
+        if not BOT_WEBHOOK_SECRET:
+            return True
+        return hmac.compare_digest(telegram_secret_token, BOT_WEBHOOK_SECRET)
+
+    async def close(self) -> None:
+        # Сессия общая для всех ботов и закрывается один раз при остановке
+        await self.registry.session.close()
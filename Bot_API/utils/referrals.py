@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from configs.config import (
+    USERS_PROFILE_COLLECTION,
+    REFERRALS_COLLECTION,
+    REFERRAL_FLUSH_INTERVAL,
+    REFERRAL_FLUSH_SIZE,
+    REFERRAL_MAX_BUFFER
+)
+from configs.mongo import db
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Реферальное дерево, отдельное для каждого бота. Документ:
+# {botID, telegramID, referrerID, ancestors: [корень, ..., реферер], depth,
+#  downlineCount, referralCount, name, username, referredAt}
+referrals_collection = db[REFERRALS_COLLECTION]
+
+# Профили основного приложения: пользователь с профилем уже не новый
+users_profile_collection = db[USERS_PROFILE_COLLECTION]
+
+# Формат реферального кода совпадает с backend (REFERRAL.CODE_PREFIX и
+# VALIDATION.REFERRAL_CODE.PATTERN в app.constants.ts): ref<telegramID>
+REFERRAL_CODE_PATTERN = re.compile(r"^ref(\d{5,15})$")
+
+# Повторы записи счетчиков предков после частичной ошибки bulk_write
+COUNTER_RETRIES = 3
+
+
+def parse_referral_payload(payload: Optional[str]) -> Optional[str]:
+    """Извлекает Telegram ID реферера из payload'а команды /start"""
+    if not payload:
+        return None
+    match = REFERRAL_CODE_PATTERN.match(payload)
+    return match.group(1) if match else None
+
+
+class ReferralRecorder:
+    """
+    Накапливает связи реферер -> реферал и записывает их пачками.
+    Для каждого реферала сохраняется массив предков (materialized path),
+    а счетчики downline у всех предков увеличиваются инкрементально.
+
+    Привязываются только новые пользователи: каждый /start без ссылки
+    регистрирует пользователя корнем дерева, и у любого существующего узла
+    реферер уже не меняется. Для основного бота новым не считается и
+    пользователь с профилем (он появился до реферальной системы), поэтому
+    чужие ссылки не переписывают downline и пути существующих узлов.
+    """
+
+    def __init__(
+        self,
+        collection=referrals_collection,
+        profiles_collection=users_profile_collection,
+        flush_interval: float = REFERRAL_FLUSH_INTERVAL,
+        flush_size: int = REFERRAL_FLUSH_SIZE,
+        max_buffer: int = REFERRAL_MAX_BUFFER
+    ):
+        self.collection = collection
+        self.profiles_collection = profiles_collection
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+
+        # (botID, telegramID) -> (telegramID реферера или None для корня, name, username, check_profile)
+        self._buffer: Dict[Tuple[int, str], Tuple[Optional[str], str, str, bool]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._pending = None
+
+        # Метрики
+        self.stats = {
+            "flushes": 0,
+            "recorded": 0,
+            "skipped": 0,
+            "failed": 0,
+            "counter_drift": 0,
+            "dropped": 0
+        }
+
+    def capture(
+        self,
+        bot_id: int,
+        telegram_id: str,
+        referrer_id: Optional[str] = None,
+        name: str = "",
+        username: str = "",
+        check_profile: bool = False
+    ):
+        """
+        Ставит связь в очередь на запись. Без referrer_id пользователь
+        регистрируется корнем; check_profile — не привязывать пользователей
+        с профилем основного приложения.
+        """
+        key = (bot_id, telegram_id)
+        if telegram_id == referrer_id or key in self._buffer:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"⚠️ Буфер рефералов переполнен, связей отброшено: {self.stats['dropped']}")
+            return
+
+        self._buffer[key] = (referrer_id, name, username, check_profile)
+        if len(self._buffer) >= self.flush_size and (self._pending is None or self._pending.done()):
+            self._pending = asyncio.create_task(self.flush())
+
+    async def _load_nodes(self, keys) -> Dict[Tuple[int, str], dict]:
+        """Загружает существующие узлы дерева одним запросом"""
+        ids_by_bot = defaultdict(set)
+        for bot_id, telegram_id in keys:
+            ids_by_bot[bot_id].add(telegram_id)
+
+        query = {"$or": [
+            {"botID": bot_id, "telegramID": {"$in": list(ids)}}
+            for bot_id, ids in ids_by_bot.items()
+        ]}
+        projection = {"botID": 1, "telegramID": 1, "referrerID": 1, "ancestors": 1, "downlineCount": 1}
+        nodes = {}
+        async for node in self.collection.find(query, projection):
+            nodes[(node["botID"], node["telegramID"])] = node
+        return nodes
+
+    async def _load_profiled(self, buffer) -> set:
+        """Возвращает рефералов, у которых уже есть профиль основного приложения"""
+        ids = {
+            telegram_id
+            for (_, telegram_id), (referrer_id, _, _, check_profile) in buffer.items()
+            if referrer_id and check_profile
+        }
+        if not ids:
+            return set()
+        profiled = set()
+        async for profile in self.profiles_collection.find({"telegramID": {"$in": list(ids)}}, {"telegramID": 1}):
+            profiled.add(profile["telegramID"])
+        return profiled
+
+    def _plan(self, buffer, nodes, profiled):
+        """Строит пути для новых связей с учетом цепочек внутри пачки"""
+        assigned: Dict[Tuple[int, str], List[str]] = {}
+        has_downline = set()
+        new_roots = set()
+        edges = []
+
+        for (bot_id, telegram_id), (referrer_id, name, username, check_profile) in buffer.items():
+            key = (bot_id, telegram_id)
+            if referrer_id is None:
+                # /start без ссылки: новый пользователь становится корнем
+                if key not in nodes and key not in assigned:
+                    new_roots.add(key)
+                continue
+
+            # Привязываются только новые пользователи
+            referrer_key = (bot_id, referrer_id)
+            if key in nodes or key in has_downline or (check_profile and telegram_id in profiled):
+                self.stats["skipped"] += 1
+                continue
+
+            if referrer_key in assigned:
+                referrer_ancestors = assigned[referrer_key]
+            elif referrer_key in nodes:
+                referrer_ancestors = nodes[referrer_key].get("ancestors", [])
+            else:
+                referrer_ancestors = []
+                new_roots.add(referrer_key)
+
+            if telegram_id in referrer_ancestors:
+                self.stats["skipped"] += 1
+                continue
+
+            ancestors = referrer_ancestors + [referrer_id]
+            assigned[key] = ancestors
+            has_downline.add(referrer_key)
+            new_roots.discard(key)
+            edges.append((bot_id, telegram_id, referrer_id, ancestors, name, username))
+
+        return edges, new_roots
+
+    async def flush(self) -> int:
+        """Записывает накопленные связи и обновляет счетчики предков"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+
+            buffer, self._buffer = self._buffer, {}
+            referrer_keys = {
+                (bot_id, referrer_id)
+                for (bot_id, _), (referrer_id, _, _, _) in buffer.items()
+                if referrer_id
+            }
+
+            try:
+                nodes = await self._load_nodes(set(buffer) | referrer_keys)
+                profiled = await self._load_profiled(buffer)
+                edges, new_roots = self._plan(buffer, nodes, profiled)
+                recorded = await self._write(edges, new_roots)
+            except Exception as e:
+                self.stats["failed"] += len(buffer)
+                logger.error(f"❌ Ошибка при записи рефералов: {e}")
+                recorded = 0
+
+            self.stats["flushes"] += 1
+            self.stats["recorded"] += recorded
+            logger.debug(f"Рефералы записаны: {recorded}, метрики: {self.stats}")
+            return recorded
+
+    async def _write(self, edges, new_roots) -> int:
+        """Записывает узлы пачкой, затем инкрементирует счетчики предков"""
+        if not edges and not new_roots:
+            return 0
+
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"botID": bot_id, "telegramID": telegram_id, "referrerID": {"$exists": False}},
+                {
+                    "$set": {
+                        "referrerID": referrer_id,
+                        "ancestors": ancestors,
+                        "depth": len(ancestors),
+                        "name": name,
+                        "username": username,
+                        "referredAt": now
+                    },
+                    "$setOnInsert": {"downlineCount": 0, "referralCount": 0}
+                },
+                upsert=True
+            )
+            for bot_id, telegram_id, referrer_id, ancestors, name, username in edges
+        ]
+        # Рефереры, которых еще нет в дереве, становятся корнями
+        operations += [
+            UpdateOne(
+                {"botID": bot_id, "telegramID": telegram_id},
+                {"$setOnInsert": {"ancestors": [], "depth": 0, "downlineCount": 0, "referralCount": 0}},
+                upsert=True
+            )
+            for bot_id, telegram_id in new_roots
+        ]
+
+        failed = set()
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self.stats["failed"] += len(failed)
+
+        # Инкременты агрегируются по узлу: один запрос на предка за пачку
+        downline = defaultdict(int)
+        direct = defaultdict(int)
+        for index, (bot_id, _, referrer_id, ancestors, _, _) in enumerate(edges):
+            if index in failed:
+                continue
+            direct[(bot_id, referrer_id)] += 1
+            for ancestor_id in ancestors:
+                downline[(bot_id, ancestor_id)] += 1
+
+        counters = [
+            UpdateOne(
+                {"botID": bot_id, "telegramID": telegram_id},
+                {"$inc": {"downlineCount": count, "referralCount": direct.get((bot_id, telegram_id), 0)}}
+            )
+            for (bot_id, telegram_id), count in downline.items()
+        ]
+        # Узлы уже записаны: ошибка счетчиков не делает связи неудачными
+        await self._increment_counters(counters)
+
+        return len(edges) - len([index for index in failed if index < len(edges)])
+
+    async def _increment_counters(self, counters):
+        """
+        Инкрементирует счетчики предков. После BulkWriteError повторяются
+        только операции с ошибками (остальные уже применены); при другой
+        ошибке исход неизвестен, и повтор мог бы посчитать $inc дважды,
+        поэтому расхождение только логируется.
+        """
+        for attempt in range(COUNTER_RETRIES):
+            if not counters:
+                return
+            try:
+                await self.collection.bulk_write(counters, ordered=False)
+                return
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                counters = [operation for index, operation in enumerate(counters) if index in failed]
+                if attempt < COUNTER_RETRIES - 1:
+                    await asyncio.sleep(0.5 * (attempt + 1))
+            except Exception as e:
+                logger.error(f"❌ Ошибка при записи счетчиков рефералов: {e}")
+                break
+
+        if not counters:
+            return
+        self.stats["counter_drift"] += len(counters)
+        logger.error(
+            f"❌ Счетчики рефералов расходятся: не применено {len(counters)} инкрементов: "
+            f"{[(operation._filter, operation._doc) for operation in counters]}"
+        )
+
+    async def _flush_loop(self):
+        """Периодически сбрасывает буфер по таймеру"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self):
+        """Создает индекс и запускает фоновую запись"""
+        try:
+            await self.collection.create_index([("botID", ASCENDING), ("telegramID", ASCENDING)], unique=True)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при создании индекса рефералов: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Останавливает фоновую запись и записывает остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Запись рефералов остановлена, метрики: {self.stats}")
+
+
+# Общий экземпляр для хендлеров
+referral_recorder = ReferralRecorder()
+
@@ -0,0 +1,75 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+from configs.config import EDIT_CACHE_SIZE
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+
+class EditCache:
+    """LRU-кэш хэшей содержимого сообщений по ключу (bot_id, chat_id, message_id)"""
+
+    def __init__(self, max_size: int = EDIT_CACHE_SIZE):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+        self.stats = {"edits": 0, "skipped": 0}
+
+    def is_same(self, key, content_hash) -> bool:
+        """Проверяет, показывает ли сообщение уже это содержимое"""
+        if self._hashes.get(key) != content_hash:
+            return False
+        self._hashes.move_to_end(key)
+        return True
+
+    def remember(self, key, content_hash):
+        """Запоминает текущее содержимое сообщения"""
+        self._hashes[key] = content_hash
+        self._hashes.move_to_end(key)
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+
+
+# Общий кэш для всех хендлеров
+edit_cache = EditCache()
+
+
+def content_hash(text: str, parse_mode: Optional[str], reply_markup: Optional[InlineKeyboardMarkup]) -> int:
+    """Хэш текста, режима разметки и клавиатуры сообщения"""
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup else None
+    return hash((text, parse_mode, markup))
+
+
+async def edit_text(
+    message: Message,
+    text: str,
+    parse_mode: Optional[str] = None,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    cache: EditCache = edit_cache
+):
+    """
+    Редактирует текст сообщения, пропуская запрос к Bot API,
+    если сообщение уже показывает то же содержимое.
+    """
+    bot_id = message.bot.id if message.bot else None
+    key = (bot_id, message.chat.id, message.message_id)
+    new_hash = content_hash(text, parse_mode, reply_markup)
+    if cache.is_same(key, new_hash):
+        cache.stats["skipped"] += 1
+        return None
+
+    try:
+        result = await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # Содержимое совпало с тем, что уже было в сообщении до появления в кэше
+        if "message is not modified" not in str(e):
+            raise
+        result = None
+        cache.stats["skipped"] += 1
+    else:
+        cache.stats["edits"] += 1
+
+    cache.remember(key, new_hash)
+    return result
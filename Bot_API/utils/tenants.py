@@ -0,0 +1,123 @@
+import logging
+from typing import Dict, List, Optional
+from aiogram import Bot
+from configs.config import SUPERUSER_COLLECTION, BOT_SETTINGS_COLLECTION, BOTS_COLLECTION
+from configs.mongo import db
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+superuser_collection = db[SUPERUSER_COLLECTION]
+bot_settings_collection = db[BOT_SETTINGS_COLLECTION]
+bots_collection = db[BOTS_COLLECTION]
+
+# Настройки подключенных клиентских ботов: bot_id -> документ из коллекции bots.
+# Основной бот здесь не хранится: его админы — superusers, видео — bot_settings
+tenant_settings: Dict[int, dict] = {}
+
+# Кэш вступительных видео: bot_id -> file_id
+welcome_video_ids: Dict[int, Optional[str]] = {}
+
+
+def register_tenant(bot_id: int, settings: dict):
+    """Регистрирует (или обновляет) настройки клиентского бота"""
+    tenant_settings[bot_id] = settings
+    welcome_video_ids[bot_id] = settings.get("welcomeVideoId")
+
+
+def unregister_tenant(bot_id: int):
+    """Удаляет настройки и кэш клиентского бота"""
+    tenant_settings.pop(bot_id, None)
+    welcome_video_ids.pop(bot_id, None)
+
+
+def is_tenant(bot: Bot) -> bool:
+    """Проверяет, является ли бот подключенным клиентским ботом"""
+    return bot.id in tenant_settings
+
+
+async def is_admin(bot: Bot, telegram_id: str) -> bool:
+    """Проверяет, является ли пользователь админом данного бота"""
+    settings = tenant_settings.get(bot.id)
+    if settings is not None:
+        return telegram_id in settings.get("admins", [])
+    return await superuser_collection.find_one({"telegramID": telegram_id}) is not None
+
+
+async def get_admins(bot: Bot) -> List[dict]:
+    """Возвращает список админов бота в формате документов superusers"""
+    settings = tenant_settings.get(bot.id)
+    if settings is not None:
+        return [{"telegramID": admin_id} for admin_id in settings.get("admins", [])]
+    return await superuser_collection.find().to_list(length=None)
+
+
+async def add_admin(bot: Bot, telegram_id: str) -> bool:
+    """Добавляет админа бота, возвращает False, если он уже есть"""
+    if await is_admin(bot, telegram_id):
+        return False
+
+    settings = tenant_settings.get(bot.id)
+    if settings is not None:
+        await bots_collection.update_one({"token": bot.token}, {"$addToSet": {"admins": telegram_id}})
+        settings.setdefault("admins", []).append(telegram_id)
+    else:
+        await superuser_collection.update_one(
+            {"telegramID": telegram_id},
+            {"$set": {"telegramID": telegram_id}},
+            upsert=True
+        )
+    return True
+
+
+async def remove_admin(bot: Bot, telegram_id: str) -> bool:
+    """Удаляет админа бота, возвращает False, если он не найден"""
+    settings = tenant_settings.get(bot.id)
+    if settings is not None:
+        result = await bots_collection.update_one({"token": bot.token}, {"$pull": {"admins": telegram_id}})
+        admins = settings.get("admins", [])
+        if telegram_id in admins:
+            admins.remove(telegram_id)
+        return result.modified_count > 0
+
+    result = await superuser_collection.delete_one({"telegramID": telegram_id})
+    return result.deleted_count > 0
+
+
+def get_welcome_video_id(bot: Bot) -> Optional[str]:
+    """Возвращает file_id вступительного видео бота из кэша"""
+    return welcome_video_ids.get(bot.id)
+
+
+async def load_welcome_video_id(bot: Bot):
+    """Загружает video_id основного бота из БД и сохраняет в кэш"""
+    try:
+        settings = await bot_settings_collection.find_one({"key": "welcome_video_id"})
+        if settings:
+            welcome_video_ids[bot.id] = settings.get("value")
+            logger.info(f"✅ Вступительное видео загружено из БД: {welcome_video_ids[bot.id]}")
+        else:
+            welcome_video_ids[bot.id] = None
+            logger.info("ℹ️ Вступительное видео не найдено в БД")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при загрузке video_id: {e}")
+        welcome_video_ids[bot.id] = None
+
+
+async def save_welcome_video_id(bot: Bot, video_id: str):
+    """Сохраняет video_id бота в БД и обновляет кэш"""
+    try:
+        settings = tenant_settings.get(bot.id)
+        if settings is not None:
+            await bots_collection.update_one({"token": bot.token}, {"$set": {"welcomeVideoId": video_id}})
+            settings["welcomeVideoId"] = video_id
+        else:
+            await bot_settings_collection.update_one(
+                {"key": "welcome_video_id"},
+                {"$set": {"key": "welcome_video_id", "value": video_id}},
+                upsert=True
+            )
+        welcome_video_ids[bot.id] = video_id
+        logger.info(f"✅ Вступительное видео сохранено в БД и кэш обновлен: {video_id}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при сохранении video_id: {e}")